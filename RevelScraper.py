@@ -7,7 +7,7 @@ from selenium.common.exceptions import (
     TimeoutException,
     WebDriverException
 )
-import time
+from bisect import bisect_left
 import re
 import logging
 
@@ -18,160 +18,303 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_LIST_TAGS = frozenset({"ul", "ol"})
+_MEDIA_TAGS = frozenset({"img", "video", "source", "audio", "iframe", "embed", "object"})
+_MONTH_RE = re.compile(r'(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\s+\d+')
+
+# Serializes the active page entry, its title, the next button and, on Reading
+# pages, the page content in a single WebDriver call instead of fetching tag names,
+# texts and attributes element by element. Returns null until the active page entry
+# is rendered and `loaded: false` until a content root other than the previous
+# page's (arguments[0], with fingerprint arguments[1]) has rendered and is unchanged
+# since the last poll (fingerprint arguments[2]), so it can be polled.
+_PAGE_SNAPSHOT_JS = """
+var previousRoot = arguments[0];
+var previousFingerprint = arguments[1];
+var polledFingerprint = arguments[2];
+
+var active = document.querySelector('li[class*="active-page"]');
+if (!active) {
+    return null;
+}
+var root = document.querySelector('.page-content');
+var rootText = root ? root.textContent : '';
+var state = {
+    page: active,
+    title: active.innerText.trim(),
+    next: document.querySelector('button[class*="navigationBtn"][aria-label*="next page"]'),
+    root: root,
+    fingerprint: root ? rootText.length + ':' + rootText.slice(0, 200) : null,
+    loaded: true
+};
+if (state.title.indexOf('Reading') === -1) {
+    return state;
+}
+
+// The active entry can move before the new content renders, so the previous
+// page's content must have been replaced or changed first.
+if (!root || (root === previousRoot && state.fingerprint === previousFingerprint)) {
+    state.loaded = false;
+    return state;
+}
+
+// An empty or still rendering root is not serialized: the content must have text
+// and be unchanged since the previous poll.
+if (!rootText.trim() || state.fingerprint !== polledFingerprint) {
+    state.loaded = false;
+    return state;
+}
+
+var CONTENT = 'p, ul, ol, img, video, source, audio, iframe, embed, object';
+var HEADERS = 'p.paragraphNumeroUno, h1, h2, h3, h4, h5, h6';
+
+// textContent skips the layout pass innerText needs; whitespace is collapsed as rendering would.
+function text(el) {
+    return el.textContent.replace(/\s+/g, ' ').trim();
+}
+
+// A nested list is a content node of its own, so its text is left out of the item.
+function itemText(li) {
+    if (!li.querySelector('ul, ol')) {
+        return text(li);
+    }
+    var clone = li.cloneNode(true);
+    clone.querySelectorAll('ul, ol').forEach(function (list) { list.remove(); });
+    return text(clone);
+}
+
+// Mirrors WebElement.get_attribute: resolved property first, raw attribute otherwise.
+function attr(el, name) {
+    var prop = el[name];
+    return typeof prop === 'string' && prop ? prop : el.getAttribute(name);
+}
+
+// Content and headers are collected in one document-order pass; their positions
+// let list titles be resolved without querying the DOM again for every list.
+var content = new Set(root.querySelectorAll(CONTENT));
+var snapshot = Object.assign(state, {nodes: [], numeroUno: [], headings: []});
+document.querySelectorAll(CONTENT + ', ' + HEADERS).forEach(function (el, position) {
+    var tag = el.tagName.toLowerCase();
+    if (el.matches('p.paragraphNumeroUno')) {
+        snapshot.numeroUno.push({
+            position: position,
+            text: text(el),
+            single: el.querySelectorAll('*').length === 1
+        });
+    } else if (/^h[1-6]$/.test(tag)) {
+        snapshot.headings.push({position: position, text: text(el)});
+    }
+
+    if (content.has(el)) {
+        // Only the fields extract_content reads for this tag are computed and sent back.
+        var node = {position: position, tag: tag};
+        if (tag === 'p') {
+            node.text = text(el);
+        } else if (tag === 'ul' || tag === 'ol') {
+            node.items = Array.from(el.querySelectorAll(':scope > li')).map(itemText).filter(Boolean);
+        } else {
+            node.sources = ['src', 'data-src', 'href'].map(function (name) { return attr(el, name); });
+        }
+        snapshot.nodes.push(node);
+    }
+});
+snapshot.loaded = snapshot.nodes.length > 0;
+return snapshot;
+"""
+
+# Clicks the next "Reading" entry after the active page in the page list, skipping
+# the pages in between without loading them. Returns whether an entry was found.
+_OPEN_NEXT_READING_JS = """
+var active = document.querySelector('li[class*="active-page"]');
+if (!active) {
+    return false;
+}
+for (var li = active.nextElementSibling; li; li = li.nextElementSibling) {
+    if (li.innerText.indexOf('Reading') !== -1) {
+        (li.querySelector('a, button') || li).click();
+        return true;
+    }
+}
+return false;
+"""
+
+
+def page_left(previous_page):
+    """Wait condition: the previously active page entry is gone or no longer active."""
+    def _condition(driver):
+        try:
+            return "active-page" not in (previous_page.get_attribute("class") or "")
+        except StaleElementReferenceException:
+            return True
+    return _condition
+
+
 class RevelScraper:
-    def __init__(self, debug_port=9222):
-        self.driver = None
+    def __init__(self, debug_port=9222, driver=None):
+        self.driver = driver
+        self.owns_driver = driver is None
         self.debug_port = debug_port
         self.previous_title = None
         self.module_number = 1
+        self.toc_navigation = True
+        self.previous_content = (None, None)
 
     def setup_chrome_driver(self):
-        """Initialize Chrome WebDriver with remote debugging."""
+        """Initialize Chrome WebDriver with remote debugging, reusing an existing session."""
+        if self.driver is None:
+            try:
+                options = webdriver.ChromeOptions()
+                options.add_experimental_option("debuggerAddress", f"localhost:{self.debug_port}")
+                self.driver = webdriver.Chrome(options=options)
+                self.owns_driver = True
+                # All waits are explicit; an implicit wait would delay every failed lookup inside them.
+                self.driver.implicitly_wait(0)
+                logger.info("Chrome WebDriver initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize Chrome WebDriver: {e}")
+                raise
+
+    def wait_and_find_element(self, by, value, timeout=10):
+        """Wait for and find an element."""
         try:
-            options = webdriver.ChromeOptions()
-            options.add_experimental_option("debuggerAddress", f"localhost:{self.debug_port}")
-            self.driver = webdriver.Chrome(options=options)
-            logger.info("Chrome WebDriver initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Chrome WebDriver: {e}")
+            return WebDriverWait(self.driver, timeout).until(
+                EC.presence_of_element_located((by, value))
+            )
+        except TimeoutException:
+            logger.error(f"Element not found: {value}")
             raise
 
-    def wait_and_find_element(self, by, value, timeout=10, retries=5, parent=None):
-        """Wait for and find an element with retries."""
-        for attempt in range(retries):
+    def snapshot_page(self, timeout=10):
+        """Wait for the page to render and serialize its state and content in the same WebDriver call."""
+        snapshot = None
+        polled_fingerprint = None
+        previous_root, previous_fingerprint = self.previous_content
+
+        def loaded(driver):
+            nonlocal snapshot, previous_root, polled_fingerprint
             try:
-                if parent:
-                    element = parent.find_element(by, value)
-                else:
-                    element = WebDriverWait(self.driver, timeout).until(
-                        EC.presence_of_element_located((by, value))
-                    )
-                return element
+                snapshot = driver.execute_script(
+                    _PAGE_SNAPSHOT_JS, previous_root, previous_fingerprint, polled_fingerprint
+                )
             except StaleElementReferenceException:
-                if attempt == retries - 1:
-                    raise
-                logger.warning(f"Stale element, retry {attempt + 1}/{retries}")
-                time.sleep(1)
-            except TimeoutException:
-                logger.error(f"Element not found: {value}")
-                raise
+                # The previous content root was removed, so any root found now is new.
+                previous_root = None
+                return False
+            if snapshot:
+                polled_fingerprint = snapshot["fingerprint"]
+            return bool(snapshot and snapshot["loaded"])
 
-    def extract_content(self):
-        """Extract content from the current page with improved error handling."""
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.05).until(loaded)
+        except TimeoutException:
+            if not snapshot:
+                logger.warning("Failed to get page title: active page not found")
+            elif snapshot["root"]:
+                logger.error("Page content did not finish loading after navigation")
+            else:
+                logger.error("Element not found: page-content")
+        except Exception as e:
+            logger.error(f"Error extracting content: {e}")
+
+        if snapshot and snapshot["root"]:
+            self.previous_content = (snapshot["root"], snapshot["fingerprint"])
+
+        return snapshot or {"page": None, "title": "Unknown Module Title", "next": None}
+
+    def extract_content(self, snapshot):
+        """Build the markdown lines for a page snapshot."""
         page_data = []
         processed_sources = set()
 
+        if not snapshot.get("nodes"):
+            return page_data
+
+        numero_uno = self.index_headers(snapshot["numeroUno"])
+        headings = self.index_headers(snapshot["headings"])
+        append = page_data.append
+        extend = page_data.extend
+        seen_add = processed_sources.add
+
         try:
-            page_content = self.wait_and_find_element(By.CLASS_NAME, "page-content")
-            elements = page_content.find_elements(
-                By.XPATH,
-                "./descendant::*[self::p or self::ul or self::ol or self::img or self::video or self::source or self::audio or self::iframe or self::embed or self::object]"
-            )
+            for node in snapshot["nodes"]:
+                tag = node["tag"]
+
+                if tag == "p":
+                    append(node["text"])
+
+                elif tag in _LIST_TAGS:
+                    list_title = self.get_list_title(node["position"], numero_uno, headings)
+
+                    # check if the page data already has the list title within the last 3 or 5 lines, if so, then do not add the list title again and ensure that the list title already in the page data is preceeded by ### for markdown formatting
+                    # Check if the list title already exists within the last 3–5 lines
+                    duplicate_found = False
+                    for i in range(len(page_data) - 1, max(len(page_data) - 6, -1), -1):
+                        if list_title in page_data[i]:
+                            duplicate_found = True
+                            if not page_data[i].startswith("### "):
+                                page_data[i] = f"### {page_data[i]}"
+                            break
 
-            for element in elements:
-                try:
+                    list_items = [f"- {item}" for item in node["items"]]
 
-                    if element.tag_name == "p":
-                        paragraph_text = element.text.strip()
-                        page_data.append(paragraph_text)
-
-                    elif element.tag_name in ["ul", "ol"]:
-                        list_title = self.get_list_title(element)
-
-                        # check if the page data already has the list title within the last 3 or 5 lines, if so, then do not add the list title again and ensure that the list title already in the page data is preceeded by ### for markdown formatting
-                        # Check if the list title already exists within the last 3–5 lines
-                        duplicate_found = False
-                        for recent_line in page_data[-5:]:
-                            if list_title in recent_line:
-                                duplicate_found = True
-                                break
-
-                        if duplicate_found:
-                            for i, line in enumerate(page_data):
-                                if list_title in line:
-                                    page_data[i] = f"### {line}"
-                                    break
-
-
-                        list_items = []
-                        for li in element.find_elements(By.TAG_NAME, "li"):
-                            if li.text.strip():
-                                list_items.append(f"- {li.text.strip()}")
-
-                        if list_items:
-                            if not duplicate_found:
-                                page_data.append(f"### {list_title}")
-
-                            page_data.extend(list_items)
-
-                    elif element.tag_name in ["img", "video", "source", "audio", "iframe", "embed", "object"]:
-                        for attr in ["src", "data-src", "href"]:
-                            src = element.get_attribute(attr)
-                            if src and src not in processed_sources:
-                                processed_sources.add(src)
-                                if element.tag_name == "img":
-                                    page_data.append(f"<img src='{src}' style='max-width: 350px; display: block; margin: auto;'>")
-                                else:
-                                    media_type = element.tag_name.capitalize()
-                                    page_data.append(f"\n- [{media_type}: {src}]({src})\n")
-                                break
+                    if list_items:
+                        if not duplicate_found:
+                            append(f"### {list_title}")
 
-                except StaleElementReferenceException:
-                    logger.warning(f"Stale element encountered while processing {element.tag_name}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Error processing element {element.tag_name}: {e}")
-                    continue
+                        extend(list_items)
+
+                elif tag in _MEDIA_TAGS:
+                    for src in node["sources"]:
+                        if src and src not in processed_sources:
+                            seen_add(src)
+                            if tag == "img":
+                                append(f"<img src='{src}' style='max-width: 350px; display: block; margin: auto;'>")
+                            else:
+                                media_type = tag.capitalize()
+                                append(f"\n- [{media_type}: {src}]({src})\n")
+                            break
 
         except Exception as e:
             logger.error(f"Error extracting content: {e}")
 
         return page_data
 
-    def get_list_title(self, element, default="Listed Items"):
-        """Get the title for a list with error handling."""
-        try:
-            prev_header = self.wait_and_find_element(
-                By.XPATH,
-                "./preceding::p[contains(@class, 'paragraphNumeroUno')][1]",
-                timeout=5,
-                parent=element  # Pass the list element as parent
-            )
-
-            if prev_header and len(prev_header.find_elements(By.XPATH, ".//*")) != 1:
-                prev_header = self.wait_and_find_element(
-                    By.XPATH,
-                    "./preceding::*[self::h1 or self::h2 or self::h3 or self::h4 or self::h5 or self::h6][1]",
-                    timeout=5,
-                    parent=element  # Pass the list element as parent
-                )
+    @staticmethod
+    def index_headers(headers):
+        """Pair snapshot headers with their sorted document positions."""
+        return [header["position"] for header in headers], headers
 
-            return prev_header.text.strip() if prev_header else default
+    @staticmethod
+    def preceding_header(index, position):
+        """Get the closest header before the given document position."""
+        positions, headers = index
+        i = bisect_left(positions, position)
+        return headers[i - 1] if i else None
 
-        except (TimeoutException, StaleElementReferenceException):
-            return default
+    def get_list_title(self, position, numero_uno, headings, default="Listed Items"):
+        """Get the title for a list from the headers preceding it."""
+        header = self.preceding_header(numero_uno, position)
+        if header and not header["single"]:
+            header = self.preceding_header(headings, position)
 
-    def get_active_page_title(self):
-        """Get the title of the active page with error handling."""
-        try:
-            active_page = self.wait_and_find_element(
-                By.XPATH,
-                "//li[contains(@class, 'active-page')]"
-            )
-            return active_page.text.strip()
-        except Exception as e:
-            logger.warning(f"Failed to get page title: {e}")
-            return "Unknown Module Title"
+        return header["text"] if header and header["text"] else default
 
-    def click_next_button(self):
+    def click_next_button(self, next_button=None):
         """Click the next button with error handling."""
         try:
-            next_button = self.wait_and_find_element(
-                By.XPATH,
-                "//button[contains(@class, 'navigationBtn') and contains(@aria-label, 'next page')]"
-            )
-            next_button.click()
-            time.sleep(1)  # Allow page to load
+            clicked = False
+            if next_button is not None:
+                try:
+                    next_button.click()
+                    clicked = True
+                except StaleElementReferenceException:
+                    logger.warning("Stale next button, looking it up again")
+
+            if not clicked:
+                self.wait_and_find_element(
+                    By.XPATH,
+                    "//button[contains(@class, 'navigationBtn') and contains(@aria-label, 'next page')]"
+                ).click()
             return True
         except TimeoutException:
             logger.info("No more pages to navigate")
@@ -180,27 +323,78 @@ class RevelScraper:
             logger.error(f"Error clicking next button: {e}")
             return False
 
-    def scrape_content(self):
-        """Main method to scrape content from all pages."""
+    def open_next_reading_page(self):
+        """Open the next Reading page from the page list, if there is one."""
+        if not self.toc_navigation:
+            return False
+        try:
+            return bool(self.driver.execute_script(_OPEN_NEXT_READING_JS))
+        except Exception as e:
+            logger.warning(f"Failed to open the next Reading page: {e}")
+            return False
+
+    def start_navigation(self, next_button=None, previous_page=None):
+        """Start moving to the next page, from the page list if possible, otherwise with the next button."""
+        if previous_page is not None and self.open_next_reading_page():
+            return "list"
+        if self.click_next_button(next_button):
+            return "next"
+        return None
+
+    def finish_navigation(self, navigation, next_button=None, previous_page=None):
+        """Wait for a navigation started by start_navigation, falling back to the next button."""
+        if navigation is None:
+            return False
+        if previous_page is None or self.wait_for_page_change(previous_page):
+            return True
+
+        if navigation == "list":
+            self.disable_toc_navigation()
+            return self.finish_navigation(
+                self.start_navigation(next_button, previous_page), next_button, previous_page
+            )
+
+        logger.info("Next button did not change the page, no more pages to navigate")
+        return False
+
+    def disable_toc_navigation(self):
+        """Fall back to the next button for the rest of the run."""
+        logger.warning("Page list navigation did not change the page, using the next button instead")
+        self.toc_navigation = False
+
+    def wait_for_page_change(self, previous_page, timeout=10):
+        """Wait until the previously active page has been replaced."""
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.05).until(page_left(previous_page))
+            return True
+        except TimeoutException:
+            logger.warning("Timed out waiting for the next page to load")
+            return False
+
+    def scrape_content(self, output_path="revel_content.md"):
+        """Main method to scrape content from all pages into the given markdown file."""
         try:
             self.setup_chrome_driver()
 
-            with open("revel_content.md", "w", encoding="utf-8") as md_file:
+            with open(output_path, "w", encoding="utf-8", buffering=1 << 16) as md_file:
                 while True:
-                    page_title = self.get_active_page_title()
+                    snapshot = self.snapshot_page()
+                    active_page, page_title, next_button = snapshot["page"], snapshot["title"], snapshot["next"]
 
-                    if "Reading" not in page_title:
-                        if not self.click_next_button():
-                            break
-                        continue
+                    # Navigate before formatting and writing so the browser loads
+                    # the next page while this one is processed.
+                    navigation = self.start_navigation(next_button, active_page)
 
-                    content = self.extract_content()
+                    if "Reading" in page_title:
+                        content = self.extract_content(snapshot)
 
-                    if content:
-                        cleaned_title = self.clean_page_title(page_title)
-                        self.write_content_to_file(md_file, cleaned_title, content)
+                        if content:
+                            cleaned_title = self.clean_page_title(page_title)
+                            self.write_content_to_file(md_file, cleaned_title, content)
+                        else:
+                            logger.warning(f"No content found on page: {page_title}")
 
-                    if not self.click_next_button():
+                    if not self.finish_navigation(navigation, next_button, active_page):
                         break
 
             logger.info("Content extraction completed successfully")
@@ -208,14 +402,14 @@ class RevelScraper:
         except Exception as e:
             logger.error(f"Scraping failed: {e}")
         finally:
-            if self.driver:
+            if self.driver and self.owns_driver:
                 self.driver.quit()
+                self.driver = None
 
     @staticmethod
     def clean_page_title(title):
         """Clean the page title."""
-        title = title.replace("Reading", "").strip()
-        return re.sub(r'(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\s+\d+', '', title).strip()
+        return _MONTH_RE.sub('', title.replace("Reading", "").strip()).strip()
 
     def write_content_to_file(self, file, title, content):
         """Write content to the markdown file."""
@@ -224,9 +418,9 @@ class RevelScraper:
             self.module_number += 1
             self.previous_title = title
 
-        file.write("\n\n".join(content))
-        file.write("\n\n")
-        file.flush()
+        for part in content:
+            file.write(part)
+            file.write("\n\n")
 
 if __name__ == "__main__":
     scraper = RevelScraper()